@@ -1,35 +1,87 @@
 import base64
-import imghdr
-import six
+import binascii
 import uuid
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
 
+CHUNK_SIZE = 64 * 1024
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Класс обработки image.
+    Принимает строку base64 (data URI) или файл из multipart-запроса.
+    Base64 декодируется частями во временный файл, размер в байтах
+    и пикселях проверяется до полного декодирования изображения.
     """
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_bytes} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+        'invalid_format': 'Допустимые форматы изображения: {formats}.',
+    }
 
     def to_internal_value(self, data):
-        if isinstance(data, six.string_types):
-            if 'data:' in data and ';base64,' in data:
-                header, data = data.split(';base64,')
-            try:
-                decoded_file = base64.b64decode(data)
-            except TypeError:
-                self.fail('invalid_image')
-
-            file_name = str(uuid.uuid4())[:12]
-            file_extension = self.get_file_extension(file_name, decoded_file)
-            complete_file_name = "%s.%s" % (file_name, file_extension, )
-            data = ContentFile(decoded_file, name=complete_file_name)
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif not hasattr(data, 'read'):
+            self.fail('invalid')
+        elif data.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.fail('too_large', max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES)
+        data.name = f'{uuid.uuid4().hex[:12]}.{self.probe(data)}'
+        return super().to_internal_value(data)
 
-        return super(Base64ImageField, self).to_internal_value(data)
-
-    def get_file_extension(self, file_name, decoded_file):
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
+    def decode(self, data):
+        """
+        Декодирование частями, кратными четырём символам base64.
+        Размер результата известен по длине строки заранее.
+        """
+        start = 0
+        if data.startswith('data:'):
+            start = data.find(';base64,')
+            if not data.startswith('data:image/') or start == -1:
+                self.fail('invalid_image')
+            start += len(';base64,')
+        size = (len(data) - start) * 3 // 4 - data.count('=', -2)
+        if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.fail('too_large', max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for offset in range(start, len(data), CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[offset:offset + CHUNK_SIZE], validate=True
+                ))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_image')
+        file.seek(0)
+        return File(file, name='')
 
-        return extension
+    def probe(self, file):
+        """
+        Формат и размеры изображения по заголовку, без декодирования
+        пикселей. Возвращает расширение файла.
+        """
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if image_format not in settings.IMAGE_UPLOAD_FORMATS:
+            self.fail(
+                'invalid_format',
+                formats=', '.join(settings.IMAGE_UPLOAD_FORMATS)
+            )
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.fail(
+                'too_many_pixels', max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS
+            )
+        return 'jpg' if image_format == 'JPEG' else image_format.lower()
@@ -1,8 +1,13 @@
 import django_filters
 from distutils.util import strtobool
-from rest_framework import filters
 
-from recipes.models import Recipe
+from django import forms
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, TagRecipe
+from recipes.search import search_recipes
+from recipes.tag_registry import tag_registry
 
 
 CHOICES = (
@@ -10,11 +15,60 @@ CHOICES = (
     ('1', 'True')
 )
 
+ORDERINGS = {
+    'popular': 'popular_score',
+    'trending': 'trending_score',
+}
+
+TAGS_MODES = (
+    ('any', 'Любой из тегов'),
+    ('all', 'Все теги')
+)
+
+
+class TagsFilter(django_filters.Filter):
+    """
+    Фильтр по slug тегов. Slug переводятся в id по реестру тегов,
+    рецепты отбираются подзапросом по TagRecipe, поэтому без дублей.
+    """
+    field_class = forms.Field
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', django_filters.widgets.QueryArrayWidget)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = tag_registry.resolve(value)
+        if not tag_ids:
+            return qs.none()
+        recipes = TagRecipe.objects.filter(tag_id__in=tag_ids)
+        if self.parent.form.cleaned_data.get('tags_mode') == 'all':
+            if len(tag_ids) < len(set(value)):
+                return qs.none()
+            recipes = recipes.values('recipe').annotate(
+                tags_count=Count('tag')
+            ).filter(tags_count=len(tag_ids))
+        return qs.filter(id__in=recipes.values('recipe'))
+
 
 class RecipeFilter(django_filters.FilterSet):
 
     author = django_filters.CharFilter(field_name='author__id')
-    tags = django_filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter()
+    tags_mode = django_filters.ChoiceFilter(
+        choices=TAGS_MODES,
+        method='get_tags_mode'
+    )
+    search = django_filters.CharFilter(method='get_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Набирают популярность')
+        ),
+        method='get_ordering'
+    )
     is_favorited = django_filters.TypedChoiceFilter(
         choices=CHOICES,
         coerce=strtobool,
@@ -29,21 +83,47 @@ class RecipeFilter(django_filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_mode', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'search', 'ordering')
 
-    def get_is_favorited(self, queryset, name, value):
+    def get_tags_mode(self, queryset, name, value):
+        return queryset
 
+    def get_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск, без параметра ordering
+        рецепты идут по убыванию релевантности.
+        """
+        value = value.strip()
         if not value:
             return queryset
-        return queryset.filter(favoriterecipe__user=self.request.user)
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
 
-    def get_is_in_shopping_cart(self, queryset, name, value):
+    def get_ordering(self, queryset, name, value):
+        """
+        Рецепты по убыванию рейтинга из таблицы, которую пересчитывает
+        команда refresh_rankings, затем по дате публикации. Рецепты
+        без рейтинга остаются в выдаче с нулевым рейтингом.
+        Время пересчёта в ranked_at - для валидаторов списка.
+        """
+        return queryset.annotate(
+            ranking_score=Coalesce(
+                F(f'ranking__{ORDERINGS[value]}'), 0.0,
+                output_field=FloatField()
+            ),
+            ranked_at=F('ranking__refreshed_at')
+        ).order_by('-ranking_score', '-pub_date', '-id')
+
+    def get_is_favorited(self, queryset, name, value):
 
         if not value:
             return queryset
-        return queryset.filter(carts__user=self.request.user)
+        return queryset.filter(is_favorited=True)
 
+    def get_is_in_shopping_cart(self, queryset, name, value):
 
-class IngredientFilter(filters.SearchFilter):
-
-    search_param = 'name'
+        if not value:
+            return queryset
+        return queryset.filter(is_in_shopping_cart=True)
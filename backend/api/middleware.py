@@ -0,0 +1,179 @@
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class RequestProfile:
+    """
+    Замеры одного запроса: SQL-запросы с их временем и сериализатором,
+    который их выполнил, и время работы сериализаторов. Время запросов
+    вне сериализаторов считается отдельно, чтобы вычесть его из времени
+    представления.
+    """
+
+    def __init__(self):
+        self.view = None
+        self.queries = []
+        self.db_time = 0
+        self.view_db_time = 0
+        self.serializer_time = 0
+        self.serializers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db_time += elapsed
+            if not self.serializers:
+                self.view_db_time += elapsed
+            self.queries.append((
+                sql,
+                repr(params),
+                self.serializers[-1] if self.serializers else None
+            ))
+
+    def repeated(self, key, threshold):
+        counts = Counter(key(query) for query in self.queries)
+        return [
+            {'sql': sql[:200], 'serializer': serializer, 'count': count}
+            for (sql, serializer), count in counts.most_common()
+            if count >= threshold
+        ]
+
+    def duplicates(self, threshold):
+        """
+        Одинаковые запросы с одинаковыми параметрами.
+        """
+        return self.repeated(
+            lambda query: (f'{query[0]} {query[1]}', query[2]), threshold
+        )
+
+    def similar(self, threshold):
+        """
+        Один и тот же запрос с разными параметрами - признак N+1.
+        """
+        return self.repeated(lambda query: (query[0], query[2]), threshold)
+
+
+def profiled(to_representation):
+    @functools.wraps(to_representation)
+    def wrapper(self, instance):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return to_representation(self, instance)
+        serializer = getattr(self, 'child', self)
+        profile.serializers.append(type(serializer).__name__)
+        started = time.perf_counter()
+        try:
+            return to_representation(self, instance)
+        finally:
+            profile.serializers.pop()
+            if not profile.serializers:
+                profile.serializer_time += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def serializer_classes(base=serializers.BaseSerializer):
+    for subclass in base.__subclasses__():
+        yield subclass
+        yield from serializer_classes(subclass)
+
+
+def install_serializer_hooks():
+    """
+    Оборачивает to_representation всех сериализаторов, которые его
+    определяют, включая переопределения в подклассах: иначе время
+    и запросы вложенного сериализатора достаются внешнему.
+    """
+    for serializer_class in set(serializer_classes()):
+        method = serializer_class.__dict__.get('to_representation')
+        if (inspect.isfunction(method)
+                and not getattr(method, 'profiled', False)):
+            serializer_class.to_representation = profiled(method)
+
+
+class RequestProfilingMiddleware:
+    """
+    Считает SQL-запросы, время базы, сериализаторов и представления.
+    Время представления - общее время без сериализаторов и запросов
+    к базе, общее отдаётся как total. Всё это уходит в заголовок
+    Server-Timing и в строку лога в JSON, повторяющиеся запросы
+    помечаются вместе с сериализатором.
+    Работа при чтении StreamingHttpResponse (скачивание списка покупок)
+    идёт уже после ответа middleware и не замеряется.
+    Сериализаторы оборачиваются перед каждым представлением,
+    когда модули с ними уже импортированы.
+    Включается настройкой REQUEST_PROFILING.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.REQUEST_PROFILING_REPEAT_THRESHOLD
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        install_serializer_hooks()
+        profile = getattr(_local, 'profile', None)
+        if profile is not None:
+            profile.view = getattr(view_func, 'cls', view_func).__name__
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        _local.profile = profile
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total_time = time.perf_counter() - started
+        view_time = max(
+            total_time - profile.serializer_time - profile.view_db_time, 0
+        )
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{len(profile.queries)} queries";'
+            f'dur={profile.db_time * 1000:.1f}',
+            f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            f'view;dur={view_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ))
+        self.log(request, response, profile, view_time, total_time)
+        return response
+
+    def log(self, request, response, profile, view_time, total_time):
+        duplicates = profile.duplicates(2)
+        similar = profile.similar(self.threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': profile.view,
+            'queries': len(profile.queries),
+            'db_ms': round(profile.db_time * 1000, 1),
+            'serializer_ms': round(profile.serializer_time * 1000, 1),
+            'view_ms': round(view_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+        }
+        if duplicates:
+            record['duplicate_queries'] = duplicates
+        if similar:
+            record['similar_queries'] = similar
+        level = logging.WARNING if similar or duplicates else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
@@ -1,4 +1,10 @@
+import hashlib
+import json
+
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.response import Response
@@ -11,6 +17,38 @@ class ListRetriveViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     pass
 
 
+class ConditionalGetMixin:
+    """
+    Ответ 304 на If-None-Match и If-Modified-Since без сериализации.
+    Представление передаёт дешёвые валидаторы, из которых строится
+    ETag, и время последнего изменения данных.
+    """
+    cache_control = {'private': True, 'no_cache': True}
+    vary_headers = ()
+
+    def conditional_response(self, request, validators, get_response,
+                             last_modified=None):
+        etag = quote_etag(hashlib.md5(
+            json.dumps(validators, default=str).encode()
+        ).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = get_response()
+        if response.status_code not in (status.HTTP_200_OK,
+                                        status.HTTP_304_NOT_MODIFIED):
+            return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, **self.cache_control)
+        patch_vary_headers(response, self.vary_headers)
+        return response
+
+
 class CreateFavouriteShoppingCartMixin:
     model_class = None
     create_serializer = None
@@ -1,14 +1,144 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from foodgram.settings import PAGES
 
 
+class CappedCountPaginator(Paginator):
+    """
+    Пагинатор, который при заданном PAGINATION_COUNT_LIMIT
+    считает объекты выборки не дальше этого предела.
+    Готовые списки считаются целиком.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.PAGINATION_COUNT_LIMIT
+        if limit is None or isinstance(self.object_list, list):
+            return super().count
+        return self.object_list[:limit].count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу: следующая страница начинается
+    после последнего объекта предыдущей, без OFFSET и COUNT(*).
+    Порядок - по убыванию полей keyset_fields представления.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return PAGES
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [
+                queryset.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound('Неверный курсор.')
+
+    def filter_after(self, queryset, values):
+        """
+        Объекты строго после курсора в порядке убывания полей:
+        (a < x) или (a = x и b < y) и т.д.
+        """
+        conditions = []
+        for index, field in enumerate(self.fields):
+            equal = [
+                Q(**{previous: values[position]})
+                for position, previous in enumerate(self.fields[:index])
+            ]
+            conditions.append(reduce(
+                and_, equal, Q(**{f'{field}__lt': values[index]})
+            ))
+        return queryset.filter(reduce(or_, conditions))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fields = view.keyset_fields
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*(f'-{field}' for field in self.fields))
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self.filter_after(
+                queryset, self.decode_cursor(queryset, cursor)
+            )
+        results = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
 class CustomPagination(PageNumberPagination):
     """
     Пагинатор проекта.
+    Для представлений с keyset_fields параметр cursor
+    включает постраничный вывод по ключу.
     """
     page_size = PAGES
     page_size_query_param = 'limit'
+    django_paginator_class = CappedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (getattr(view, 'keyset_fields', None)
+                and KeysetPagination.cursor_query_param
+                in request.query_params):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
 
 
 class RecipesLimitPagination(PageNumberPagination):
@@ -0,0 +1,119 @@
+import csv
+import io
+import logging
+import os
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+logger = logging.getLogger(__name__)
+
+
+class ShoppingListRenderer(ABC, BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Строки списка - словари из агрегирующего запроса корзины,
+    файл отдаётся по частям генератором stream.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.stream(data))
+
+    @abstractmethod
+    def stream(self, rows):
+        """
+        Генератор частей файла в байтах.
+        """
+
+    @staticmethod
+    def row_values(row):
+        return (
+            row['ingredient__name'],
+            row['ingredients_number'],
+            row['ingredient__measurement_unit'],
+        )
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            name, amount, unit = self.row_values(row)
+            yield f'{name} -- {amount} {unit}\n'.encode(self.charset)
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Продукт', 'Количество', 'Единица измерения')
+
+    def stream(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for row in rows:
+            writer.writerow(self.row_values(row))
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode(self.charset)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """
+    Строки рисуются по мере чтения из базы, но reportlab
+    собирает документ целиком, поэтому готовый файл
+    отдаётся частями после сохранения.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    line_height = 18
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        if not os.path.exists(settings.SHOPPING_LIST_FONT):
+            logger.warning(
+                'Шрифт %s не найден, кириллица в PDF не отобразится',
+                settings.SHOPPING_LIST_FONT
+            )
+            return 'Helvetica'
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.SHOPPING_LIST_FONT)
+        )
+        return self.font_name
+
+    def stream(self, rows):
+        buffer = io.BytesIO()
+        font = self.get_font()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - self.margin
+        pdf.setFont(font, self.font_size)
+        for row in rows:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            name, amount, unit = self.row_values(row)
+            pdf.drawString(self.margin, y, f'{name} -- {amount} {unit}')
+            y -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        chunk = buffer.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = buffer.read(self.chunk_size)
@@ -1,12 +1,34 @@
 from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Tag, TagRecipe)
+from recipes.images import variant_names
+from recipes.recipe_index import recipe_index
+from recipes.shopping_list import invalidate_recipes_shopping_lists
+from recipes.tag_registry import tag_registry
 from users.models import Subscribe, User
 from .fields import Base64ImageField
 
 
+def get_subscribed_author_ids(request):
+    """
+    Множество id авторов, на которых подписан пользователь.
+    Загружается один раз за запрос и кешируется на объекте запроса,
+    поэтому вложенные сериализаторы пользователей не делают
+    отдельного запроса на каждого автора.
+    """
+    if not hasattr(request, '_subscribed_author_ids'):
+        request._subscribed_author_ids = set(
+            Subscribe.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request._subscribed_author_ids
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели пользователя.
@@ -29,15 +51,9 @@ class UserSerializer(serializers.ModelSerializer):
         Функция обработки параметра подписчиков.
         """
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
-        return(
-            Subscribe.objects.filter(
-                user=request.user,
-                author__id=obj.id
-            ).exists()
-            and request.user.is_authenticated
-        )
+        return obj.id in get_subscribed_author_ids(request)
 
 
 class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
@@ -52,6 +68,8 @@ class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
         """
         Функция обработки параметра избранного.
         """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -62,6 +80,8 @@ class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -72,6 +92,31 @@ class ShoppingCartFavoriteRecipes(metaclass=serializers.SerializerMetaclass):
         )
 
 
+class ImageVariants(metaclass=serializers.SerializerMetaclass):
+    """
+    Класс ссылок на уменьшенные варианты картинки рецепта.
+    """
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        """
+        Ссылки по размерам и форматам, пока варианты
+        не созданы - None.
+        """
+        if not obj.image or obj.variants_image != obj.image.name:
+            return None
+        request = self.context.get('request')
+        urls = {}
+        for variant, names in variant_names(obj.image.name).items():
+            urls[variant] = {}
+            for extension, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][extension] = url
+        return urls
+
+
 class RecipesCount(metaclass=serializers.SerializerMetaclass):
     """
     Класс определения количества рецептов автора.
@@ -81,7 +126,7 @@ class RecipesCount(metaclass=serializers.SerializerMetaclass):
         """
         Функция подсчёта количества рецептов автора.
         """
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -127,14 +172,20 @@ class IngredientInRecipeShortSerializer(serializers.ModelSerializer):
         model = IngredientInRecipe
         fields = ('id', 'amount')
 
+    def to_representation(self, instance):
+        """
+        id продукта берётся из внешнего ключа без загрузки продукта.
+        """
+        return {'id': instance.ingredient_id, 'amount': instance.amount}
+
 
 class RecipeSerializer(serializers.ModelSerializer,
-                       ShoppingCartFavoriteRecipes):
+                       ShoppingCartFavoriteRecipes, ImageVariants):
     """
     Сериализатор модели рецептов. Чтение.
     """
     author = UserSerializer(many=False)
-    tags = TagSerializer(many=True)
+    tags = serializers.SerializerMethodField()
     ingredients = IngredientInRecipeSerializer(many=True,
                                                source='recipe_ingredient')
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -143,17 +194,45 @@ class RecipeSerializer(serializers.ModelSerializer,
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'name', 'ingredients', 'text',
-                  'cooking_time', 'pub_date', 'image', 'tags',
-                  'is_favorited', 'is_in_shopping_cart')
+                  'cooking_time', 'pub_date', 'image', 'image_variants',
+                  'tags', 'is_favorited', 'is_in_shopping_cart')
+
+    def get_tags(self, obj):
+        """
+        Теги рецепта из реестра тегов, из базы берутся только их id.
+        Реестр читается один раз на весь список рецептов.
+        """
+        if 'tags' not in self.context:
+            self.context['tags'] = tag_registry.get_tags()
+        tags = self.context['tags']
+        return [
+            tags[tag_id] for tag_id in sorted(
+                tag_recipe.tag_id for tag_recipe in obj.tagrecipe_set.all()
+            )
+            if tag_id in tags
+        ]
 
 
-class RecipeShortFieldSerializer(serializers.ModelSerializer):
+class RecipeMatchSerializer(RecipeSerializer):
+    """
+    Сериализатор рецептов, подобранных по имеющимся продуктам:
+    доля имеющихся продуктов и число недостающих.
+    """
+    coverage = serializers.FloatField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage', 'missing_count')
+
+
+class RecipeShortFieldSerializer(serializers.ModelSerializer,
+                                 ImageVariants):
     """
     Сериализатор короткой версии отображения модели рецептов.
     """
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = ('id', 'name', 'cooking_time', 'image', 'image_variants')
 
 
 class RecipeSerializerPost(serializers.ModelSerializer,
@@ -177,40 +256,45 @@ class RecipeSerializerPost(serializers.ModelSerializer,
                   'cooking_time', 'is_favorited')
 
     def validate_ingredients(self, value):
-        ingredients_list = []
-        ingredients = value
-        for ingredient in ingredients:
+        ingredient_ids = []
+        for ingredient in value:
             if ingredient['amount'] < 1:
                 raise serializers.ValidationError(
                     'Количество должно быть равным или больше 1!')
-            check_id = ingredient['ingredient']['id']
-            check_ingredient = Ingredient.objects.filter(id=check_id)
-            if not check_ingredient.exists():
-                raise serializers.ValidationError(
-                    'Ингредиента нет в базе!')
-            if check_ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    'Продукты не должны повторяться!')
-            ingredients_list.append(check_ingredient)
+            ingredient_ids.append(ingredient['ingredient']['id'])
+        unique_ids = set(ingredient_ids)
+        if len(unique_ids) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Продукты не должны повторяться!')
+        if Ingredient.objects.filter(id__in=unique_ids).count() != len(
+                unique_ids):
+            raise serializers.ValidationError(
+                'Ингредиента нет в базе!')
+        return value
+
+    def validate_tags(self, value):
+        if len({tag.id for tag in value}) != len(value):
+            raise serializers.ValidationError(
+                'Теги не должны повторяться!')
         return value
 
     def add_ingredients_and_tags(self, tags, ingredients, recipe):
         """
         Функция добавления тегов и продуктов в рецепт.
         """
-        for tag in tags:
-            recipe.tags.add(tag)
-        for ingredient in ingredients:
-            if not IngredientInRecipe.objects.filter(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe).exists():
-                IngredientInRecipe.objects.create(
-                    ingredient_id=ingredient['ingredient']['id'],
-                    recipe=recipe,
-                    amount=ingredient['amount']
-                )
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag=tag, recipe=recipe) for tag in tags
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                ingredient_id=ingredient['ingredient']['id'],
+                recipe=recipe,
+                amount=ingredient['amount']
+            ) for ingredient in ingredients
+        )
         return recipe
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         Функция создания рецепта.
@@ -219,17 +303,80 @@ class RecipeSerializerPost(serializers.ModelSerializer,
         ingredients = validated_data.pop('recipe_ingredient')
         recipe = Recipe.objects.create(**validated_data)
         recipe = self.add_ingredients_and_tags(tags, ingredients, recipe)
+        recipe_index.changed([recipe.id])
         return recipe
 
+    def update_tags(self, tags, recipe):
+        """
+        Функция изменения тегов рецепта по разнице
+        с сохранёнными тегами.
+        """
+        current_ids = set(TagRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('tag_id', flat=True))
+        new_ids = {tag.id for tag in tags}
+        if current_ids - new_ids:
+            TagRecipe.objects.filter(
+                recipe=recipe,
+                tag_id__in=current_ids - new_ids
+            ).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag_id=tag_id, recipe=recipe)
+            for tag_id in new_ids - current_ids
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Функция изменения продуктов рецепта по разнице
+        с сохранёнными продуктами.
+        Возвращает True, если состав рецепта изменился.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        new = {
+            ingredient['ingredient']['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed_ids = current.keys() - new.keys()
+        if removed_ids:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed_ids
+            ).delete()
+        added = [
+            IngredientInRecipe(
+                ingredient_id=ingredient_id,
+                recipe=recipe,
+                amount=amount
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ]
+        IngredientInRecipe.objects.bulk_create(added)
+        changed = []
+        for ingredient_id, row in current.items():
+            if ingredient_id in new and row.amount != new[ingredient_id]:
+                row.amount = new[ingredient_id]
+                changed.append(row)
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        return bool(removed_ids or added or changed)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Функция редактирования рецепта.
+        Теги и продукты меняются, только если переданы в запросе.
         """
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('recipe_ingredient')
-        TagRecipe.objects.filter(recipe=instance).delete()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        instance = self.add_ingredients_and_tags(tags, ingredients, instance)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipe_ingredient', None)
+        if tags is not None:
+            self.update_tags(tags, instance)
+        if ingredients is not None and self.update_ingredients(
+                ingredients, instance):
+            invalidate_recipes_shopping_lists([instance.id])
+            recipe_index.changed([instance.id])
         super().update(instance, validated_data)
         return instance
 
@@ -245,10 +392,7 @@ class SubscribeSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipe_author.count',
-        read_only=True
-    )
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     class Meta:
         model = Subscribe
@@ -258,31 +402,17 @@ class SubscribeSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """
         Функция обработки параметра подписчиков.
+        Каждая запись списка - подписка текущего пользователя.
         """
-        request = self.context.get('request')
-        if not request:
-            return True
-        return(
-            Subscribe.objects.filter(
-                user=request.user,
-                author__id=obj.id
-            ).exists()
-            and request.user.is_authenticated
-        )
+        return True
 
     def get_recipes(self, obj):
         """
         Функция получения рецептов
-        автора.
+        автора, подгруженных во вьюсете.
         """
-        try:
-            recipes_limit = int(
-                self.context.get('request').query_params['recipes_limit']
-            )
-            recipes = Recipe.objects.filter(author=obj.author)[:recipes_limit]
-        except Exception:
-            recipes = Recipe.objects.filter(author=obj.author)
-        serializer = RecipeShortFieldSerializer(recipes, many=True,)
+        serializer = RecipeShortFieldSerializer(obj.author.recipes_preview,
+                                                many=True,)
         return serializer.data
 
 
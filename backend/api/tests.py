@@ -0,0 +1,464 @@
+import json
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework import serializers
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.middleware import RequestProfilingMiddleware
+
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag, TagRecipe)
+from recipes.ranking import refresh_rankings
+from recipes.recipe_index import recipe_index
+from recipes.search import SQLITE_TRIGGER_NAMES
+from recipes.shopping_list import get_version
+from users.models import Subscribe, User
+
+LIST_QUERIES = 5
+RETRIEVE_QUERIES = 5
+ANONYMOUS_LIST_QUERIES = 4
+ANONYMOUS_RETRIEVE_QUERIES = 4
+
+
+class RecipeQueryCountTest(APITestCase):
+    """
+    Число SQL-запросов ленты и страницы рецепта не зависит
+    от размера страницы и числа продуктов в рецепте.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'user@foodgram.ru', 'user', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        authors = [
+            User.objects.create_user(
+                f'author{index}@foodgram.ru', f'author{index}', 'password',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for index in range(5)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color=f'#00000{index}',
+                slug=f'tag{index}'
+            )
+            for index in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {index}', measurement_unit='г'
+            )
+            for index in range(30)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=authors[index % len(authors)], name=f'Рецепт {index}',
+                image='recipes/image.jpg', text='Описание', cooking_time=10
+            )
+            for index in range(30)
+        ]
+        cls.small_recipe, cls.large_recipe = recipes[0], recipes[1]
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag=tag, recipe=recipe)
+            for recipe in recipes for tag in tags
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+            for recipe in recipes[1:] for ingredient in ingredients
+        )
+        IngredientInRecipe.objects.create(
+            recipe=cls.small_recipe, ingredient=ingredients[0], amount=1
+        )
+        Favorite.objects.create(user=cls.user, recipe=cls.large_recipe)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.large_recipe)
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assert_queries(self, queries, url):
+        self.get(url)
+        with self.assertNumQueries(queries):
+            return self.get(url)
+
+    def test_list(self):
+        self.client.force_authenticate(self.user)
+        for limit in (1, 30):
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    LIST_QUERIES, f'/api/recipes/?limit={limit}'
+                )
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_anonymous(self):
+        for limit in (1, 30):
+            with self.subTest(limit=limit):
+                self.assert_queries(
+                    ANONYMOUS_LIST_QUERIES, f'/api/recipes/?limit={limit}'
+                )
+
+    def test_retrieve(self):
+        self.client.force_authenticate(self.user)
+        for recipe in (self.small_recipe, self.large_recipe):
+            with self.subTest(recipe=recipe.name):
+                self.assert_queries(
+                    RETRIEVE_QUERIES, f'/api/recipes/{recipe.id}/'
+                )
+
+    def test_retrieve_anonymous(self):
+        for recipe in (self.small_recipe, self.large_recipe):
+            with self.subTest(recipe=recipe.name):
+                self.assert_queries(
+                    ANONYMOUS_RETRIEVE_QUERIES, f'/api/recipes/{recipe.id}/'
+                )
+
+
+@skipUnless(connection.vendor in ('postgresql', 'sqlite'),
+            'Полнотекстовый поиск есть в PostgreSQL и SQLite')
+class RecipeSearchTest(APITestCase):
+    """
+    Поиск по названию и описанию вместе с фильтром по тегам
+    и постраничным выводом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            'author@foodgram.ru', 'author', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        lunch = Tag.objects.create(
+            name='Обед', color='#000001', slug='lunch'
+        )
+        dinner = Tag.objects.create(
+            name='Ужин', color='#000002', slug='dinner'
+        )
+        recipes = [
+            ('Борщ украинский', 'Свёкла и капуста', lunch),
+            ('Борщ зелёный', 'Щавель и яйцо', lunch),
+            ('Борщ холодный', 'На кефире', lunch),
+            ('Щи', 'Подаются как борщ', lunch),
+            ('Борщ постный', 'Без мяса', dinner),
+            ('Борщ2', 'Второй вариант', dinner),
+            ('Солянка', 'Копчёности и оливки', lunch),
+        ]
+        cls.recipes = {}
+        for name, text, tag in recipes:
+            recipe = Recipe.objects.create(
+                author=author, name=name, image='recipes/image.jpg',
+                text=text, cooking_time=10
+            )
+            TagRecipe.objects.create(tag=tag, recipe=recipe)
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_search_with_tags_and_pages(self):
+        names = []
+        query = 'search=борщ&tags=lunch&limit=2'
+        for page in (1, 2):
+            data = self.search(f'{query}&page={page}')
+            self.assertEqual(data['count'], 4)
+            names += [recipe['name'] for recipe in data['results']]
+        self.assertIsNone(data['next'])
+        self.assertEqual(len(names), 4)
+        self.assertEqual(
+            set(names),
+            {'Борщ украинский', 'Борщ зелёный', 'Борщ холодный', 'Щи'}
+        )
+        self.assertEqual(names[-1], 'Щи')
+
+    def test_search_text(self):
+        data = self.search('search=кефир')
+        self.assertEqual(
+            [recipe['name'] for recipe in data['results']], ['Борщ холодный']
+        )
+
+    def test_search_word_prefixes(self):
+        for query, names in (
+            ('борщ&tags=dinner', ['Борщ постный', 'Борщ2']),
+            ('борщ кефир', ['Борщ холодный']),
+            ('орщ', []),
+        ):
+            with self.subTest(query=query):
+                data = self.search(f'search={query}')
+                self.assertEqual(
+                    sorted(recipe['name'] for recipe in data['results']),
+                    names
+                )
+
+    def test_search_operators(self):
+        for query in ('"борщ', 'борщ OR', '-', '*', 'борщ AND NOT'):
+            with self.subTest(query=query):
+                self.search(f'search={query}')
+
+    def test_search_after_update(self):
+        recipe = self.recipes['Солянка']
+        recipe.name = 'Борщ сборный'
+        recipe.save()
+        data = self.search('search=сборный')
+        self.assertEqual(
+            [item['id'] for item in data['results']], [recipe.id]
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'Триггеры FTS5 есть в SQLite')
+    def test_sqlite_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'recipes_recipe'"
+            )
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(names, set(SQLITE_TRIGGER_NAMES))
+
+
+class RecipeMatchTest(APITestCase):
+    """
+    Подбор рецептов по имеющимся продуктам через обратный индекс.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            'author@foodgram.ru', 'author', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {index}', measurement_unit='г'
+            )
+            for index in range(5)
+        ]
+        cls.recipes = []
+        for count in (1, 2, 4):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {count}',
+                image='recipes/image.jpg', text='Описание', cooking_time=10
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in cls.ingredients[:count]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def match(self, ingredients, exclude=()):
+        query = '&'.join(
+            [f'ingredients={ingredient.id}' for ingredient in ingredients]
+            + [f'exclude={ingredient.id}' for ingredient in exclude]
+        )
+        response = self.client.get(f'/api/recipes/match/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe['id'], recipe['coverage'], recipe['missing_count'])
+            for recipe in response.data['results']
+        ]
+
+    def test_ranking(self):
+        one, two, four = self.recipes
+        self.assertEqual(
+            self.match(self.ingredients[:2]),
+            [(two.id, 1.0, 0), (one.id, 1.0, 0), (four.id, 0.5, 2)]
+        )
+
+    def test_exclude(self):
+        one, two, four = self.recipes
+        self.assertEqual(
+            self.match(self.ingredients[:2], exclude=self.ingredients[2:3]),
+            [(two.id, 1.0, 0), (one.id, 1.0, 0)]
+        )
+
+    def test_invalid_ids(self):
+        for query in ('', 'ingredients=x', 'ingredients=1&exclude=y'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/match/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_changed_recipe(self):
+        one, two, four = self.recipes
+        self.match(self.ingredients[:1])
+        IngredientInRecipe.objects.filter(recipe=four).delete()
+        IngredientInRecipe.objects.create(
+            recipe=four, ingredient=self.ingredients[4], amount=1
+        )
+        recipe_index.publish([four.id])
+        self.assertEqual(
+            self.match(self.ingredients[4:]), [(four.id, 1.0, 0)]
+        )
+        self.assertEqual(
+            [recipe_id for recipe_id, _, _ in self.match(
+                self.ingredients[:1])],
+            [one.id, two.id]
+        )
+
+
+class RecipeOrderingTest(APITestCase):
+    """
+    Сортировка по рейтингу меняет только порядок ленты:
+    рецепты без рейтинга остаются в выдаче.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'user@foodgram.ru', 'user', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {index}',
+                image='recipes/image.jpg', text='Описание', cooking_time=10
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], Recipe.objects.count())
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_without_rankings(self):
+        latest = self.ids('')
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.ids(f'ordering={ordering}'), latest)
+
+    def test_unranked_recipe_stays(self):
+        first, second, third = self.recipes
+        Favorite.objects.create(user=self.user, recipe=first)
+        refresh_rankings()
+        unranked = Recipe.objects.create(
+            author=self.user, name='Новый рецепт',
+            image='recipes/image.jpg', text='Описание', cooking_time=10
+        )
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(
+                    self.ids(f'ordering={ordering}'),
+                    [first.id, unranked.id, third.id, second.id]
+                )
+
+
+class ShoppingListCacheTest(APITransactionTestCase):
+    """
+    Версия кешированного списка покупок меняется
+    только после фиксации транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            'user@foodgram.ru', 'user', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        with mock.patch('recipes.signals.schedule_variants'):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', image='recipes/image.jpg',
+                text='Описание', cooking_time=10
+            )
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.amount = IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=txt'
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_version_changes_after_commit(self):
+        self.assertEqual(self.download(), 'Соль -- 1 г\n')
+        version = get_version(self.user.id)
+        with transaction.atomic():
+            self.amount.amount = 5
+            self.amount.save()
+            self.assertEqual(get_version(self.user.id), version)
+        self.assertNotEqual(get_version(self.user.id), version)
+        self.assertEqual(self.download(), 'Соль -- 5 г\n')
+
+
+class RecipesCountSerializer(serializers.Serializer):
+    """
+    Переопределяет to_representation и делает запрос на каждый объект.
+    """
+
+    def to_representation(self, instance):
+        return Recipe.objects.filter(author=instance).count()
+
+
+class AuthorSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    recipes = RecipesCountSerializer(source='*')
+
+
+def author_list(request):
+    return JsonResponse(
+        AuthorSerializer(User.objects.all(), many=True).data, safe=False
+    )
+
+
+@override_settings(REQUEST_PROFILING=True,
+                   REQUEST_PROFILING_REPEAT_THRESHOLD=3)
+class RequestProfilingTest(TestCase):
+    """
+    Повторяющиеся запросы приписываются сериализатору,
+    который их выполнил, даже если он переопределяет to_representation.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(3):
+            User.objects.create_user(
+                f'author{index}@foodgram.ru', f'author{index}', 'password',
+                first_name='Имя', last_name='Фамилия'
+            )
+
+    def test_overriding_serializer_reported(self):
+        middleware = RequestProfilingMiddleware(
+            lambda request: (
+                middleware.process_view(request, author_list, (), {})
+                or author_list(request)
+            )
+        )
+        with self.assertLogs('api.middleware', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/authors/'))
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'author_list')
+        self.assertEqual(
+            [query['serializer'] for query in record['similar_queries']],
+            ['RecipesCountSerializer']
+        )
@@ -2,8 +2,9 @@ from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from .views import (DownloadShoppingCartViewSet, FavoriteViewSet,
-                    IngredientViewSet, RecipeViewSet, ShoppingCartViewSet,
-                    SubscribeViewSet, TagViewSet, UserViewSet)
+                    IngredientViewSet, RecipeMatchViewSet, RecipeViewSet,
+                    ShoppingCartViewSet, SubscribeViewSet, TagViewSet,
+                    UserViewSet)
 
 
 app_name = 'api'
@@ -32,6 +33,8 @@ urlpatterns = [
         name='shopping_cart'),
      path('recipes/download_shopping_cart/',
           DownloadShoppingCartViewSet.as_view(), name='download'),
+     path('recipes/match/',
+          RecipeMatchViewSet.as_view(), name='match'),
      path('', include('djoser.urls')),
      path('', include(router.urls)),
      path('auth/', include('djoser.urls.authtoken')),
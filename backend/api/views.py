@@ -1,26 +1,36 @@
 from http import HTTPStatus
 
+from django.conf import settings
 from django.db import IntegrityError
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .filters import IngredientFilter, RecipeFilter
+from .filters import RecipeFilter
 from .pagination import CustomPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (CSVShoppingListRenderer, PDFShoppingListRenderer,
+                        TextShoppingListRenderer)
 from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCartSerializer, RecipeSerializer,
-                          RecipeSerializerPost, RecipeShortFieldSerializer,
-                          ShoppingCartSerializer, SubscribeSerializer,
-                          TagSerializer, UserSerializer)
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+                          RecipeCartSerializer, RecipeMatchSerializer,
+                          RecipeSerializer, RecipeSerializerPost,
+                          RecipeShortFieldSerializer, ShoppingCartSerializer,
+                          SubscribeSerializer, TagSerializer, UserSerializer)
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.recipe_index import recipe_index
+from recipes.shopping_list import get_shopping_list
+from recipes.tag_registry import tag_registry
+from recipes.versions import get_versions
 from users.models import Subscribe, User
-from api.mixins import (CreateFavouriteShoppingCartMixin,
+from api.mixins import (ConditionalGetMixin, CreateFavouriteShoppingCartMixin,
                         DeleteShoppingCartFavoriteMixin, ListRetriveViewSet)
 
 
@@ -40,9 +50,51 @@ class SubscribeViewSet(viewsets.ModelViewSet):
     serializer_class = SubscribeSerializer
     permission_classes = (permissions.IsAuthenticated,)
     pagination_class = CustomPagination
+    keyset_fields = ('id',)
+
+    def get_recipes_limit(self):
+        """
+        Число рецептов автора в выдаче из параметра recipes_limit.
+        """
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = -1
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым неотрицательным числом.'}
+            )
+        return recipes_limit
 
     def get_queryset(self):
-        return Subscribe.objects.filter(user=self.request.user)
+        """
+        Последние рецепты всех авторов страницы загружаются одним
+        запросом, число рецептов автора хранится в его записи.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:recipes_limit]
+            ))
+        return Subscribe.objects.filter(
+            user=self.request.user
+        ).order_by(
+            '-id'
+        ).select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch(
+                'author__recipe_author',
+                queryset=recipes,
+                to_attr='recipes_preview'
+            )
+        )
 
     def create(self, request, *args, **kwargs):
         """
@@ -63,9 +115,8 @@ class SubscribeViewSet(viewsets.ModelViewSet):
                 status=HTTPStatus.BAD_REQUEST
             )
         subscription = get_object_or_404(
-            Subscribe,
-            author=author,
-            user=self.request.user
+            self.get_queryset(),
+            author=author
         )
         serializer = SubscribeSerializer(subscription, many=False)
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
@@ -84,7 +135,7 @@ class SubscribeViewSet(viewsets.ModelViewSet):
         return Response(status=HTTPStatus.NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Обработка моделей рецептов.
     """
@@ -94,6 +145,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_class = RecipeFilter
     filter_backends = (DjangoFilterBackend, )
     pagination_class = CustomPagination
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+    vary_headers = ('Authorization', 'Cookie')
+
+    @property
+    def keyset_fields(self):
+        """
+        Постраничный вывод по ключу есть только у ленты по дате.
+        """
+        params = self.request.query_params
+        if 'ordering' in params or 'search' in params:
+            return None
+        return ('pub_date', 'id')
+
+    def get_queryset(self):
+        """
+        Флаги избранного и корзины считаются в том же запросе,
+        связанные объекты подгружаются заранее.
+        """
+        return Recipe.objects.for_feed().with_user_flags(self.request.user)
+
+    def get_total_count(self):
+        """
+        Число рецептов выборки, уже посчитанное пагинатором.
+        При выводе по ключу выборка не считается.
+        """
+        if self.paginator.keyset is not None:
+            return None
+        return self.paginator.page.paginator.count
+
+    def list(self, request, *args, **kwargs):
+        """
+        Валидаторы списка - id и время изменения рецептов загруженной
+        страницы в порядке выдачи и число рецептов из пагинатора,
+        без отдельного запроса по всей выборке. При сортировке
+        по рейтингу изменением считается и пересчёт рейтинга.
+        При совпадении валидаторов страница не сериализуется.
+        """
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        modified = [
+            (recipe.id, recipe.updated_at, getattr(recipe, 'ranked_at', None))
+            for recipe in page
+        ]
+        versions = get_versions(request.user)
+        return self.conditional_response(
+            request,
+            [request.get_full_path(), self.get_total_count(), modified,
+             versions],
+            lambda: self.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            ),
+            max(versions + [
+                moment.timestamp() for _, *moments in modified
+                for moment in moments if moment is not None
+            ])
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Валидаторы рецепта - время его изменения и версии данных
+        автора, продуктов и состояния пользователя.
+        """
+        updated_at = get_object_or_404(
+            Recipe.objects.values_list('updated_at', flat=True),
+            pk=kwargs['pk']
+        )
+        versions = get_versions(request.user)
+        return self.conditional_response(
+            request,
+            [kwargs['pk'], updated_at, versions],
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            max(updated_at.timestamp(), *versions)
+        )
 
     def get_serializer_class(self):
         """
@@ -118,8 +245,14 @@ class IngredientViewSet(ListRetriveViewSet):
     permission_classes = [permissions.AllowAny, ]
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, IngredientFilter)
-    search_fields = ['^name', ]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по названию выполняется по индексу в памяти.
+        """
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
 
 
 class ShoppingCartViewSet(
@@ -150,45 +283,109 @@ class FavoriteViewSet(
     create_serializer = RecipeShortFieldSerializer
 
 
-class TagViewSet(ListRetriveViewSet):
+class TagViewSet(ConditionalGetMixin, ListRetriveViewSet):
     """
     Обработка моделей тегов.
+    Теги отдаются из реестра тегов с заголовками ETag и Cache-Control,
+    повторный запрос с If-None-Match получает ответ 304.
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny, )
+    cache_control = {'public': True, 'max_age': settings.TAGS_CACHE_MAX_AGE}
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, [tag_registry.etag],
+            lambda: Response(tag_registry.all())
+        )
 
-class DownloadShoppingCartViewSet(APIView):
-    def get(self, request):
-        user = request.user
-        shopping_carts = ShoppingCart.objects.filter(
-            user=user
-        ).values_list(
-            "recipe",
-            flat=True
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tag = tag_registry.get_tags().get(int(kwargs['pk']))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise NotFound
+        return self.conditional_response(
+            request, [tag_registry.etag, tag['id']], lambda: Response(tag)
         )
-        shopping_card_ingredients = IngredientInRecipe.objects.filter(
-            recipe__in=shopping_carts
-        ).select_related(
-            "ingredient"
-        ).values(
-            "ingredient",
-            "ingredient__name",
-            "ingredient__measurement_unit"
-        ).annotate(
-            ingredients_number=Sum("amount")
+
+
+class RecipeMatchViewSet(GenericAPIView):
+    """
+    Подбор рецептов по имеющимся продуктам.
+    Продукты передаются параметрами ingredients, исключаемые продукты -
+    параметрами exclude. Рецепты подбираются по обратному индексу
+    продуктов, из базы загружается только выводимая страница.
+    """
+    serializer_class = RecipeMatchSerializer
+    pagination_class = CustomPagination
+
+    def get_ids(self, name):
+        try:
+            return [int(value) for value in
+                    self.request.query_params.getlist(name)]
+        except ValueError:
+            raise ValidationError(
+                {name: 'Должен быть списком id продуктов.'}
+            )
+
+    def get(self, request):
+        ingredient_ids = self.get_ids('ingredients')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один продукт.'}
+            )
+        matches = self.paginate_queryset(
+            recipe_index.match(ingredient_ids, self.get_ids('exclude'))
         )
+        recipes = Recipe.objects.for_feed().with_user_flags(
+            request.user
+        ).in_bulk([recipe_id for recipe_id, _, _ in matches])
+        page = []
+        for recipe_id, count, total in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(count / total, 4)
+            recipe.missing_count = total - count
+            page.append(recipe)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class DownloadShoppingCartViewSet(APIView):
+    """
+    Скачивание списка покупок.
+    Формат выбирается параметром format: txt, csv или pdf.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = (TextShoppingListRenderer,
+                        CSVShoppingListRenderer,
+                        PDFShoppingListRenderer)
+
+    def handle_exception(self, exc):
+        """
+        Ошибки отдаются в JSON, а не в формате файла.
+        """
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def get(self, request):
+        shopping_card_ingredients = get_shopping_list(request.user)
 
-        content = ''
-        for item in shopping_card_ingredients:
-            content += (f'{item["ingredient__name"]}'
-                        f' -- {item["ingredients_number"]}'
-                        f' {item["ingredient__measurement_unit"]}\n')
-        response = HttpResponse(
-            content,
-            content_type='text/plain,charset=utf8'
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(shopping_card_ingredients),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="cart.{renderer.format}"'
         )
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
         return response
@@ -39,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -90,6 +91,19 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default='foodgram'
+        ),
+    }
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -152,3 +166,68 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 PAGES = 6
+
+PAGINATION_COUNT_LIMIT = (
+    int(os.getenv('PAGINATION_COUNT_LIMIT'))
+    if os.getenv('PAGINATION_COUNT_LIMIT') else None
+)
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Как часто процесс проверяет в базе сброс индексов в памяти
+# командами загрузки данных, в секундах.
+DATA_VERSION_CHECK_INTERVAL = int(os.getenv(
+    'DATA_VERSION_CHECK_INTERVAL',
+    default=30
+))
+
+TAGS_CACHE_MAX_AGE = 60 * 60
+
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv(
+    'IMAGE_UPLOAD_MAX_BYTES',
+    default=5 * 1024 * 1024
+))
+
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv(
+    'IMAGE_UPLOAD_MAX_PIXELS',
+    default=4096 * 4096
+))
+
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', default=2))
+
+# Периоды полураспада веса добавлений в рейтингах, в днях.
+RANKING_POPULAR_HALF_LIFE = 90
+
+RANKING_TRENDING_HALF_LIFE = 3
+
+RANKING_TRENDING_WINDOW = 14
+
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', default='False') == 'True'
+
+REQUEST_PROFILING_REPEAT_THRESHOLD = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -10,7 +10,8 @@ class UserAdmin(admin.ModelAdmin):
     """
     Параметры админ зоны пользователя.
     """
-    list_display = ('username', 'email', 'id')
+    list_display = ('username', 'email', 'id', 'recipes_count',
+                    'followers_count')
     search_fields = ('username', 'email')
     empty_value_display = '-пусто-'
     list_filter = ('username', 'email')
@@ -36,17 +37,10 @@ class IngredientInRecipeInLine(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientInRecipeInLine, TagRecipeInLine,)
-    list_display = ('id', 'name', 'author', 'count_all_in_favorite')
+    list_display = ('id', 'name', 'author', 'favorites_count',
+                    'in_carts_count')
     list_filter = ('name', 'author', 'tags')
 
-    def count_all_in_favorite(self, obj):
-        """
-        Подсчёт общего числа добавлений
-        этого рецепта в избранное.
-        """
-        return Favorite.objects.filter(recipe=obj).count()
-    count_all_in_favorite.text = 'Число добавлений в избранное.'
-
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
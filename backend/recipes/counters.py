@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+
+def increment(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+
+
+def decrement(model, pk, field):
+    model.objects.filter(
+        pk=pk, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
+
+
+def count_of(model, field):
+    """
+    Подзапрос с числом строк model, ссылающихся на объект через field.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('id')
+        ).values('count')
+    ), 0)
+
+
+def rebuild_counters():
+    """
+    Пересчёт счётчиков рецептов и пользователей по данным таблиц.
+    """
+    Recipe.objects.update(
+        favorites_count=count_of(Favorite, 'recipe'),
+        in_carts_count=count_of(ShoppingCart, 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Subscribe, 'author'),
+    )
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = (
+    ('thumbnail', 160),
+    ('card', 480),
+    ('full', 1280),
+)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+VARIANTS_DIR = 'variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, variant, extension):
+    stem = os.path.splitext(name)[0]
+    return f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+
+
+def variant_names(name):
+    """
+    Имена файлов вариантов картинки: {вариант: {расширение: имя}}.
+    """
+    return {
+        variant: {
+            extension: variant_name(name, variant, extension)
+            for extension, _, _ in FORMATS
+        }
+        for variant, _ in VARIANTS
+    }
+
+
+def prepare(image, extension):
+    """
+    Первый кадр в RGB или RGBA, для JPEG прозрачность
+    заменяется белым фоном.
+    """
+    image.seek(0)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha and extension == 'jpg':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    return image
+
+
+def save_variant(image, name):
+    extension = name.rsplit('.', 1)[-1]
+    image_format, options = next(
+        (image_format, options) for ext, image_format, options in FORMATS
+        if ext == extension
+    )
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_variants(name, force=False):
+    """
+    Создаёт варианты картинки и отмечает рецепты с этой картинкой.
+    Картинки меньше варианта не увеличиваются. Варианты уже
+    загруженной ранее картинки создаются заново только при force.
+    """
+    names = variant_names(name)
+    if force or not all(
+            default_storage.exists(variant)
+            for extensions in names.values()
+            for variant in extensions.values()):
+        create_variants(name, names)
+    Recipe.objects.filter(image=name).update(
+        variants_image=name, updated_at=timezone.now()
+    )
+
+
+def create_variants(name, names):
+    with default_storage.open(name) as file, Image.open(file) as original:
+        for extension, _, _ in FORMATS:
+            source = prepare(original, extension)
+            for variant, size in VARIANTS:
+                image = source.copy()
+                image.thumbnail((size, size), Image.LANCZOS)
+                save_variant(image, names[variant][extension])
+
+
+def run_generation(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('Не удалось создать варианты картинки %s', name)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                thread_name_prefix='image-variants'
+            )
+    return _executor
+
+
+def schedule_variants(recipe):
+    """
+    Создание вариантов в фоне после фиксации транзакции,
+    если для текущей картинки рецепта их ещё нет.
+    """
+    name = recipe.image.name
+    if not name or recipe.variants_image == name:
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_generation, name)
+    )
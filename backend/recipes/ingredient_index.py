@@ -0,0 +1,83 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Ingredient
+from .versions import get_stored_version, store_version
+
+VERSION_KEY = 'ingredient_index_version'
+
+
+class IngredientIndex:
+    """
+    Индекс продуктов в памяти процесса для поиска по началу названия.
+    Строится при первом обращении и перестраивается после изменения
+    продуктов: версия индекса хранится в кеше, поэтому при общем
+    кеше изменения видят все процессы. Сброс индекса записывается
+    и в базу, так что загрузку продуктов командой сервер увидит
+    и с локальным кешем, не позже чем через DATA_VERSION_CHECK_INTERVAL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = ([], [])
+
+    def get_version(self):
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        return cache.get(VERSION_KEY), get_stored_version(VERSION_KEY)
+
+    def invalidate(self):
+        store_version(VERSION_KEY)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+        self._version = None
+
+    def build(self, version):
+        entries = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda entry: (entry['name'].casefold(), entry['id'])
+        )
+        keys = [entry['name'].casefold() for entry in entries]
+        self._index = (keys, entries)
+        self._version = version
+
+    def get_entries(self):
+        version = self.get_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self.build(version)
+        return self._index
+
+    def search(self, name):
+        """
+        Продукты, название которых начинается с name, затем те,
+        в названии которых name встречается. Пустой запрос
+        возвращает все продукты.
+        """
+        keys, entries = self.get_entries()
+        query = name.strip().casefold()
+        if not query:
+            return list(entries)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(entries[position])
+            position += 1
+        for key, entry in zip(keys, entries):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(entry)
+        return result
+
+
+ingredient_index = IngredientIndex()
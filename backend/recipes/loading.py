@@ -0,0 +1,129 @@
+import csv
+import json
+from contextlib import contextmanager
+from json.decoder import WHITESPACE
+
+from django.core.management.color import no_style
+from django.db import connection
+
+CHUNK_SIZE = 64 * 1024
+
+
+class JSONArrayReader:
+    """
+    Читает элементы JSON-массива из файла по одному,
+    не загружая файл в память целиком.
+    """
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def read_more(self):
+        if self.eof:
+            raise ValueError('Неожиданный конец JSON-массива.')
+        chunk = self.file.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def next_char(self):
+        self.position = WHITESPACE.match(self.buffer, self.position).end()
+        while self.position == len(self.buffer):
+            self.read_more()
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+        return self.buffer[self.position]
+
+    def decode(self):
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if self.eof:
+                    raise
+                self.read_more()
+                continue
+            if end < len(self.buffer) or self.eof:
+                self.position = end
+                return item
+            self.read_more()
+
+    def __iter__(self):
+        if self.next_char() != '[':
+            raise ValueError('Файл должен содержать JSON-массив.')
+        self.position += 1
+        while True:
+            char = self.next_char()
+            if char == ']':
+                return
+            if char == ',':
+                self.position += 1
+                continue
+            yield self.decode()
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    return iter(JSONArrayReader(file, chunk_size))
+
+
+def iter_csv_rows(file, fieldnames):
+    """
+    Читает строки CSV-файла как словари.
+    Строка заголовка, совпадающая с fieldnames, пропускается.
+    """
+    for row in csv.reader(file):
+        if not row or tuple(row) == tuple(fieldnames):
+            continue
+        yield dict(zip(fieldnames, row))
+
+
+def iter_batches(items, batch_size):
+    """
+    Группирует элементы в списки длиной batch_size.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def auto_date_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+
+
+@contextmanager
+def explicit_dates(fields):
+    """
+    Отключает auto_now и auto_now_add, чтобы сохранить переданные даты.
+    """
+    fields = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def reset_sequences(models):
+    """
+    Сдвигает последовательности первичных ключей после вставки
+    объектов с явными id.
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
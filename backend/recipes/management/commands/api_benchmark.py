@@ -0,0 +1,139 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, rank):
+    """
+    Процентиль по ближайшему рангу.
+    """
+    ordered = sorted(values)
+    index = max(int(round(rank / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.decode().strip()
+
+
+class Command(BaseCommand):
+    help = ('measuring latency percentiles and sql query counts '
+            'of the main api endpoints, report is written in json')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', default=50, type=int)
+        parser.add_argument('--limit', default=settings.PAGES, type=int)
+        parser.add_argument('--recipes-limit', default=3, type=int)
+        parser.add_argument('--output', default='benchmark.json', type=str)
+
+    def get_user(self):
+        """
+        Пользователь с самым большим числом подписок и покупок,
+        чтобы нагрузка была близка к худшему случаю.
+        """
+        user = User.objects.annotate(
+            subscriptions=Count('follower', distinct=True),
+            carts=Count('shoppingcart', distinct=True),
+        ).order_by('-subscriptions', '-carts').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('Сначала создайте данные: '
+                               'manage.py generate_data')
+        return user
+
+    def get_endpoints(self, options):
+        names = Ingredient.objects.values_list('name', flat=True)[:100]
+        prefixes = sorted({name[:2] for name in names}) or ['а']
+        recipes_url = f'/api/recipes/?limit={options["limit"]}'
+        return {
+            'recipes': lambda i: recipes_url,
+            'recipes_page': lambda i: f'{recipes_url}&page={i % 5 + 1}',
+            'subscriptions': lambda i: (
+                f'/api/users/subscriptions/?limit={options["limit"]}'
+                f'&recipes_limit={options["recipes_limit"]}'
+            ),
+            'ingredients': lambda i: (
+                f'/api/ingredients/?name={prefixes[i % len(prefixes)]}'
+            ),
+            'download_shopping_cart': lambda i: (
+                '/api/recipes/download_shopping_cart/'
+            ),
+        }
+
+    def request(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed * 1000, len(queries)
+
+    def measure(self, client, make_url, count):
+        self.request(client, make_url(0))
+        timings = []
+        query_counts = []
+        statuses = set()
+        for i in range(count):
+            status, elapsed, queries = self.request(client, make_url(i))
+            statuses.add(status)
+            timings.append(elapsed)
+            query_counts.append(queries)
+        result = {
+            'url': make_url(0),
+            'statuses': sorted(statuses),
+            'queries': max(query_counts),
+            'mean_ms': round(statistics.mean(timings), 2),
+        }
+        for rank in PERCENTILES:
+            result[f'p{rank}_ms'] = round(percentile(timings, rank), 2)
+        return result
+
+    def handle(self, *args, **options):
+        user = self.get_user()
+        client = APIClient(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        client.force_authenticate(user)
+        report = {
+            'created': timezone.now().isoformat(),
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'endpoints': {},
+        }
+        for name, make_url in self.get_endpoints(options).items():
+            result = self.measure(client, make_url, options['requests'])
+            report['endpoints'][name] = result
+            self.stdout.write(
+                f'{name}: p50 {result["p50_ms"]} мс, '
+                f'p95 {result["p95_ms"]} мс, {result["queries"]} запросов'
+            )
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отчёт записан в {options["output"]}'
+        ))
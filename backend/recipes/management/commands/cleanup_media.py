@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.media import cleanup, rebuild_references
+
+
+class Command(BaseCommand):
+    help = ('deleting recipe images and their variants '
+            'that no recipe has referenced for a while')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', default=60, type=int)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='recount references from recipes first')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with transaction.atomic():
+                rebuild_references()
+        deleted = cleanup(
+            timezone.now() - timedelta(minutes=options['grace_minutes'])
+        )
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {deleted}'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.media import delete_file, rebuild_references
+from recipes.models import Recipe
+from recipes.storage import CONTENT_DIR, content_storage
+
+
+class Command(BaseCommand):
+    help = ('moving recipe images saved under random names '
+            'to content hash names, identical images are merged')
+
+    def move(self, name):
+        with content_storage.open(name) as file:
+            new_name = content_storage.save(name, file)
+        Recipe.objects.filter(image=name).update(
+            image=new_name, updated_at=timezone.now()
+        )
+        return new_name
+
+    def handle(self, *args, **options):
+        names = list(
+            Recipe.objects.exclude(image='').exclude(
+                image__startswith=f'{CONTENT_DIR}/'
+            ).order_by().values_list('image', flat=True).distinct()
+        )
+        moved = {}
+        with transaction.atomic():
+            for name in names:
+                if not content_storage.exists(name):
+                    self.stderr.write(f'{name}: файл отсутствует')
+                    continue
+                moved[name] = self.move(name)
+            rebuild_references()
+        for name in moved:
+            delete_file(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {len(moved)}, '
+            f'уникальных: {len(set(moved.values()))}'
+        ))
@@ -0,0 +1,153 @@
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from recipes.counters import rebuild_counters
+from recipes.ingredient_index import ingredient_index
+from recipes.loading import (auto_date_fields, explicit_dates, iter_json_array,
+                             reset_sequences)
+from recipes.recipe_index import recipe_index
+from recipes.tag_registry import tag_registry
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+LEGACY_LABELS = {
+    'auth.user': 'users.user',
+    'api.ingredient': 'recipes.ingredient',
+    'api.tag': 'recipes.tag',
+    'api.recipe': 'recipes.recipe',
+    'api.ingredientamount': 'recipes.ingredientinrecipe',
+    'api.cart': 'recipes.shoppingcart',
+    'api.favorite': 'recipes.favorite',
+    'api.follow': 'users.subscribe',
+    'api.subscribe': 'users.subscribe',
+}
+
+LEVELS = (
+    ('users.user',),
+    ('recipes.tag', 'recipes.ingredient'),
+    ('recipes.recipe',),
+    ('recipes.ingredientinrecipe', 'recipes.tagrecipe',
+     'recipes.shoppingcart', 'recipes.favorite', 'users.subscribe'),
+)
+
+
+class Command(BaseCommand):
+    help = ('loading django fixture from data with legacy model labels, '
+            'in foreign key order with bulk inserts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', default='init_data.json', nargs='?',
+                            type=str)
+        parser.add_argument('--batch-size', default=5000, type=int)
+
+    def iter_records(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for record in iter_json_array(f):
+                label = record['model'].lower()
+                yield LEGACY_LABELS.get(label, label), record
+
+    def convert(self, field, value):
+        if field.is_relation:
+            return value
+        value = field.to_python(value)
+        if (not settings.USE_TZ and hasattr(value, 'tzinfo')
+                and timezone.is_aware(value)):
+            value = timezone.make_naive(value, timezone.utc)
+        return value
+
+    def build_object(self, model, record):
+        values = {model._meta.pk.attname: record['pk']}
+        for name, value in record['fields'].items():
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                values[field.attname] = self.convert(field, value)
+        for field in self.auto_dates[model]:
+            if values.get(field.attname) is None:
+                values[field.attname] = timezone.now()
+        return model(**values)
+
+    def build_through_objects(self, model, record, labels):
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            if through._meta.label_lower not in labels:
+                continue
+            for target_id in record['fields'].get(field.name, ()):
+                yield through(**{
+                    f'{field.m2m_field_name()}_id': record['pk'],
+                    f'{field.m2m_reverse_field_name()}_id': target_id,
+                })
+
+    def flush(self, model, batch):
+        model.objects.bulk_create(batch)
+        self.counts[model._meta.label] += len(batch)
+        batch.clear()
+
+    def add(self, batches, obj):
+        batch = batches[obj.__class__]
+        batch.append(obj)
+        if len(batch) >= self.batch_size:
+            self.flush(obj.__class__, batch)
+
+    def load_level(self, labels):
+        """
+        Проход по файлу, в котором вставляются только модели уровня.
+        """
+        batches = defaultdict(list)
+        for label, record in self.iter_records():
+            model = apps.get_model(label) if label in self.models else None
+            if model is None:
+                continue
+            if label in labels:
+                self.add(batches, self.build_object(model, record))
+            for obj in self.build_through_objects(model, record, labels):
+                self.add(batches, obj)
+        for model, batch in batches.items():
+            if batch:
+                self.flush(model, batch)
+
+    def handle(self, *args, **options):
+        self.path = os.path.join(DATA_ROOT, options['filename'])
+        self.batch_size = options['batch_size']
+        self.models = {label for level in LEVELS for label in level}
+        self.auto_dates = {
+            apps.get_model(label): auto_date_fields(apps.get_model(label))
+            for label in self.models
+        }
+        self.counts = Counter()
+        if not os.path.exists(self.path):
+            raise CommandError('Файл отсутствует в директории data')
+        started = time.monotonic()
+        try:
+            with transaction.atomic(), explicit_dates(
+                    field for fields in self.auto_dates.values()
+                    for field in fields):
+                for labels in LEVELS:
+                    self.load_level(labels)
+                reset_sequences(list(self.auto_dates))
+                rebuild_counters()
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Ошибка в файле фикстуры: {error}')
+        except IntegrityError as error:
+            raise CommandError(f'Фикстура не согласуется с базой: {error}')
+        ingredient_index.invalidate()
+        recipe_index.invalidate()
+        tag_registry.invalidate()
+        elapsed = time.monotonic() - started
+        total = sum(self.counts.values())
+        for label, count in sorted(self.counts.items()):
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {total} объектов '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
@@ -0,0 +1,174 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.counters import rebuild_counters
+from recipes.loading import (auto_date_fields, explicit_dates, iter_batches,
+                             reset_sequences)
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag, TagRecipe)
+from recipes.recipe_index import recipe_index
+from recipes.tag_registry import tag_registry
+from users.models import Subscribe, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#2D9CDB', 'baking'),
+    ('Суп', '#EB5757', 'soup'),
+)
+BATCH_SIZE = 5000
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('generating synthetic users, recipes, favorites, carts '
+            'and subscriptions for benchmarks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=100, type=int)
+        parser.add_argument('--recipes-per-user', default=10, type=int)
+        parser.add_argument('--ingredients-per-recipe', default=8, type=int)
+        parser.add_argument('--tags-per-recipe', default=2, type=int)
+        parser.add_argument('--favorites-per-user', default=20, type=int)
+        parser.add_argument('--carts-per-user', default=5, type=int)
+        parser.add_argument('--subscriptions-per-user', default=10, type=int)
+        parser.add_argument('--days', default=365, type=int,
+                            help='period of recipe publication dates')
+        parser.add_argument('--seed', default=0, type=int)
+
+    def insert(self, model, objects):
+        count = 0
+        for batch in iter_batches(objects, BATCH_SIZE):
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        self.stdout.write(f'{model._meta.label}: {count}')
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        first_id = next_id(User)
+        password = make_password('password')
+        self.insert(User, (
+            User(id=user_id, email=f'user{user_id}@example.com',
+                 username=f'user{user_id}', password=password,
+                 first_name='Имя', last_name=f'Фамилия {user_id}')
+            for user_id in range(first_id, first_id + count)
+        ))
+        return list(range(first_id, first_id + count))
+
+    def random_date(self, options):
+        return self.now - timedelta(
+            seconds=self.random.randint(0, options['days'] * 86400)
+        )
+
+    def create_recipes(self, user_ids, options):
+        first_id = next_id(Recipe)
+        recipe_ids = []
+        authors = {}
+        recipes = []
+        for user_id in user_ids:
+            for _ in range(options['recipes_per_user']):
+                recipe_id = first_id + len(recipe_ids)
+                recipe_ids.append(recipe_id)
+                authors[recipe_id] = user_id
+                pub_date = self.random_date(options)
+                recipes.append(Recipe(
+                    id=recipe_id, author_id=user_id,
+                    name=f'Рецепт {recipe_id}', image='recipes/sample.jpg',
+                    text=f'Описание рецепта {recipe_id}',
+                    cooking_time=self.random.randint(5, 180),
+                    pub_date=pub_date, updated_at=pub_date,
+                ))
+        with explicit_dates(auto_date_fields(Recipe)):
+            self.insert(Recipe, recipes)
+        return recipe_ids, authors
+
+    def create_recipe_relations(self, recipe_ids, tag_ids, options):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError('Сначала загрузите продукты: '
+                               'manage.py ingredients_loading')
+        tag_weights = [1 / rank for rank in range(1, len(tag_ids) + 1)]
+        tags_per_recipe = min(options['tags_per_recipe'], len(tag_ids))
+        self.insert(IngredientInRecipe, (
+            IngredientInRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                               amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids, options['ingredients_per_recipe'])
+        ))
+        self.insert(TagRecipe, (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in set(self.random.choices(
+                tag_ids, tag_weights, k=tags_per_recipe))
+        ))
+
+    def sample(self, population, count, exclude):
+        count = min(count, len(population) - 1)
+        chosen = set()
+        while len(chosen) < count:
+            item = self.random.choice(population)
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+    def create_user_relations(self, user_ids, recipe_ids, authors, options):
+        """
+        Популярность рецептов и авторов растёт с их порядковым номером
+        в выборке, как в реальной ленте с небольшим числом лидеров.
+        """
+        weighted_recipes = recipe_ids[:max(len(recipe_ids) // 5, 1)]
+        for model, count in ((Favorite, options['favorites_per_user']),
+                             (ShoppingCart, options['carts_per_user'])):
+            with explicit_dates(auto_date_fields(model)):
+                self.insert(model, (
+                    model(user_id=user_id, recipe_id=recipe_id,
+                          created_at=self.random_date(options))
+                    for user_id in user_ids
+                    for recipe_id in self.sample(
+                        self.random.choice((weighted_recipes, recipe_ids)),
+                        count, None)
+                    if authors[recipe_id] != user_id
+                ))
+        self.insert(Subscribe, (
+            Subscribe(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(
+                user_ids, options['subscriptions_per_user'], user_id)
+        ))
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        started = time.monotonic()
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids, authors = self.create_recipes(user_ids, options)
+            self.create_recipe_relations(recipe_ids, tag_ids, options)
+            self.create_user_relations(user_ids, recipe_ids, authors, options)
+            reset_sequences([User, Recipe])
+            rebuild_counters()
+        recipe_index.invalidate()
+        tag_registry.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('generating thumbnail, card and full size variants '
+            'of recipe images that have none yet')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='regenerate variants of every image')
+        parser.add_argument('--workers', default=settings.IMAGE_VARIANT_WORKERS,
+                            type=int)
+
+    def generate(self, name):
+        try:
+            generate_variants(name, force=self.force)
+        except Exception as error:
+            return name, error
+        finally:
+            connections.close_all()
+        return name, None
+
+    def handle(self, *args, **options):
+        self.force = options['all']
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.exclude(variants_image=F('image'))
+        names = list(
+            recipes.order_by().values_list('image', flat=True).distinct()
+        )
+        started = time.monotonic()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for name, error in executor.map(self.generate, names):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Варианты созданы для {len(names) - failed} картинок '
+            f'из {len(names)} за {time.monotonic() - started:.1f} с'
+        ))
@@ -1,36 +1,71 @@
-import json
 import os
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
 
+from recipes.ingredient_index import ingredient_index
+from recipes.loading import iter_batches, iter_csv_rows, iter_json_array
 from recipes.models import Ingredient
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+FIELDS = ('name', 'measurement_unit')
+
+
+def normalize(value):
+    return ' '.join(str(value).split())
 
 
 class Command(BaseCommand):
-    help = 'loading ingredients from data in json'
+    help = 'loading ingredients from data in json or csv'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def read_rows(self, file, filename):
+        if filename.endswith('.csv'):
+            return iter_csv_rows(file, FIELDS)
+        return iter_json_array(file)
+
+    def unique_ingredients(self, rows):
+        """
+        Нормализует строки файла и пропускает повторы.
+        """
+        seen = set()
+        for row in rows:
+            key = tuple(normalize(row[field]) for field in FIELDS)
+            if not all(key) or key in seen:
+                continue
+            seen.add(key)
+            yield Ingredient(name=key[0], measurement_unit=key[1])
 
     def handle(self, *args, **options):
+        filename = options['filename']
+        started = time.monotonic()
+        count_before = Ingredient.objects.count()
+        rows_read = 0
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
+            with open(os.path.join(DATA_ROOT, filename), 'r',
                       encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(name=ingredient["name"],
-                                                  measurement_unit=ingredient[
-                                                      "measurement_unit"])
-                    except IntegrityError:
-                        print(f'Ингридиет {ingredient["name"]} '
-                              f'{ingredient["measurement_unit"]} '
-                              f'уже есть в базе')
-
+                ingredients = self.unique_ingredients(
+                    self.read_rows(f, filename)
+                )
+                for batch in iter_batches(ingredients,
+                                          options['batch_size']):
+                    Ingredient.objects.bulk_create(batch,
+                                                   ignore_conflicts=True)
+                    rows_read += len(batch)
         except FileNotFoundError:
             raise CommandError('Файл отсутствует в директории data')
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Ошибка в файле {filename}: {error}')
+        ingredient_index.invalidate()
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {rows_read} продуктов, добавлено {created}, '
+            f'уже были в базе {rows_read - created} '
+            f'({rows_read / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
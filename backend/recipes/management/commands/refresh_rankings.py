@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = ('recomputing popular and trending recipe rankings '
+            'from favorites and shopping carts, run periodically')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = refresh_rankings()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги {count} рецептов пересчитаны '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,80 @@
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .images import variant_names
+from .models import MediaFile, Recipe
+from .storage import content_storage
+
+
+def acquire(name):
+    """
+    Добавляет ссылку на файл.
+    """
+    if not name:
+        return
+    if MediaFile.objects.filter(name=name).update(
+            references=F('references') + 1, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        acquire(name)
+
+
+def release(name):
+    """
+    Убирает ссылку на файл. Сам файл не удаляется сразу: его может
+    в этот момент повторно загрузить другой рецепт.
+    """
+    if not name:
+        return
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1, updated_at=timezone.now()
+    )
+
+
+def delete_file(name):
+    content_storage.delete(name)
+    for names in variant_names(name).values():
+        for variant in names.values():
+            default_storage.delete(variant)
+
+
+def cleanup(older_than):
+    """
+    Удаляет файлы без ссылок, не менявшиеся с момента older_than.
+    Возвращает число удалённых файлов.
+    """
+    deleted = 0
+    names = MediaFile.objects.filter(
+        references=0, updated_at__lt=older_than
+    ).values_list('name', flat=True)
+    for name in list(names):
+        with transaction.atomic():
+            count, _ = MediaFile.objects.filter(
+                name=name, references=0, updated_at__lt=older_than
+            ).delete()
+            if count:
+                delete_file(name)
+                deleted += 1
+    return deleted
+
+
+def rebuild_references():
+    """
+    Пересчёт ссылок по картинкам рецептов. Файлы, на которые
+    не ссылается ни один рецепт, получают ноль ссылок.
+    """
+    counts = dict(
+        Recipe.objects.exclude(image='').order_by().values_list(
+            'image'
+        ).annotate(count=Count('id'))
+    )
+    MediaFile.objects.update(references=0)
+    for name, count in counts.items():
+        MediaFile.objects.update_or_create(
+            name=name, defaults={'references': count}
+        )
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.19 on 2026-10-17 05:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_duplicate_ingredients(apps, schema_editor):
+    """
+    Оставляет по одному продукту на пару (название, единица измерения),
+    ссылки рецептов на дубликаты переносятся на оставшийся продукт.
+    В PostgreSQL отложенные проверки внешних ключей выполняются сразу,
+    иначе следующий ALTER TABLE падает на ожидающих триггерах.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=group['first_id'])
+        for row in IngredientInRecipe.objects.filter(ingredient__in=extra):
+            if IngredientInRecipe.objects.filter(
+                    recipe_id=row.recipe_id,
+                    ingredient_id=group['first_id']).exists():
+                row.delete()
+            else:
+                row.ingredient_id = group['first_id']
+                row.save()
+        extra.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20220912_1800'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favoriterecipe', to='recipes.Recipe', verbose_name='Рецепт'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
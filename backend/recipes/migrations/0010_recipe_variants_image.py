@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='variants_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Картинка, для которой созданы варианты'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.19 on 2026-10-17 06:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reciperanking',
+            name='refreshed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время пересчёта'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.utils import timezone
 
-from users.models import User
+from .storage import content_storage
+from users.models import CounterFieldsMixin, User
 
 
 class Tag(models.Model):
@@ -45,12 +48,64 @@ class Ingredient(models.Model):
 
     class Meta:
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:15]
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """
+    Выборки рецептов для ленты.
+    """
+
+    def for_feed(self):
+        """
+        Подгружает автора, id тегов и продукты рецептов
+        фиксированным числом запросов. Сами теги берутся
+        из реестра тегов.
+        """
+        return self.select_related('author').prefetch_related(
+            Prefetch(
+                'tagrecipe_set',
+                queryset=TagRecipe.objects.only('tag_id', 'recipe_id')
+            ),
+            Prefetch(
+                'recipe_ingredient',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами is_favorited и is_in_shopping_cart
+        для пользователя одним запросом вместо запроса на каждый рецепт.
+        """
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            )),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """
     Модель рецептов.
     """
@@ -65,7 +120,13 @@ class Recipe(models.Model):
         verbose_name='Название',
         max_length=200,
     )
-    image = models.ImageField('Картинка',)
+    image = models.ImageField('Картинка', storage=content_storage)
+    variants_image = models.CharField(
+        'Картинка, для которой созданы варианты',
+        max_length=100,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField('Описание',)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -86,10 +147,37 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Число добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('favorites_count', 'in_carts_count')
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:15]
@@ -144,6 +232,10 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепты',
         related_name='carts',
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -173,6 +265,10 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favoriterecipe',
     )
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -208,3 +304,74 @@ class TagRecipe(models.Model):
 
     def __str__(self):
         return f'{self.tag} {self.recipe}'
+
+
+class RecipeRanking(models.Model):
+    """
+    Рейтинги рецептов по добавлениям в избранное и список покупок
+    с затуханием по времени. Пересчитываются командой refresh_rankings.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    popular_score = models.FloatField('Популярность', default=0)
+    trending_score = models.FloatField('Набирает популярность', default=0)
+    refreshed_at = models.DateTimeField('Время пересчёта', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popular_score', '-recipe'],
+                name='ranking_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-recipe'],
+                name='ranking_trending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.popular_score:.2f}'
+
+
+class MediaFile(models.Model):
+    """
+    Число рецептов, ссылающихся на файл картинки.
+    Файл без ссылок удаляет команда cleanup_media.
+    """
+
+    name = models.CharField('Файл', max_length=100, unique=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class DataVersion(models.Model):
+    """
+    Время полного сброса индексов в памяти процессов. Его пишут
+    команды загрузки данных, которые выполняются в отдельном процессе
+    и не могут сбросить индексы сервера через локальный кеш.
+    """
+
+    name = models.CharField('Индекс', max_length=100, unique=True)
+    updated_at = models.DateTimeField('Дата сброса', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .loading import iter_batches
+from .models import Favorite, RecipeRanking, ShoppingCart
+
+WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 2.0),
+)
+BATCH_SIZE = 5000
+
+
+def decayed_scores(today, half_life, since=None):
+    """
+    Сумма добавлений рецепта в избранное и список покупок,
+    вес каждого добавления вдвое меньше за каждые half_life дней.
+    Добавления группируются по дням в базе.
+    """
+    scores = defaultdict(float)
+    for model, weight in WEIGHTS:
+        rows = model.objects.all()
+        if since is not None:
+            rows = rows.filter(created_at__gte=since)
+        rows = rows.annotate(
+            day=TruncDate('created_at')
+        ).order_by().values_list('recipe_id', 'day').annotate(
+            count=Count('id')
+        )
+        for recipe_id, day, count in rows.iterator():
+            age = max((today - day).days, 0)
+            scores[recipe_id] += weight * count * 0.5 ** (age / half_life)
+    return scores
+
+
+@transaction.atomic
+def refresh_rankings():
+    """
+    Пересчитывает таблицу рейтингов целиком. Время пересчёта
+    хранится в строках рейтинга и попадает в валидаторы списка,
+    поэтому условные запросы видят новый порядок в любом процессе.
+    Возвращает число рецептов с рейтингом.
+    """
+    now = timezone.now()
+    popular = decayed_scores(
+        now.date(), settings.RANKING_POPULAR_HALF_LIFE
+    )
+    trending = decayed_scores(
+        now.date(), settings.RANKING_TRENDING_HALF_LIFE,
+        since=now - timedelta(days=settings.RANKING_TRENDING_WINDOW)
+    )
+    RecipeRanking.objects.all().delete()
+    for batch in iter_batches((
+        RecipeRanking(
+            recipe_id=recipe_id,
+            popular_score=score,
+            trending_score=trending.get(recipe_id, 0),
+            refreshed_at=now,
+        )
+        for recipe_id, score in popular.items()
+    ), BATCH_SIZE):
+        RecipeRanking.objects.bulk_create(batch)
+    return len(popular)
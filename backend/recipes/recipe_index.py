@@ -0,0 +1,198 @@
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import IngredientInRecipe
+from .versions import get_stored_version, store_version
+
+VERSION_KEY = 'recipe_index_version'
+CHANGES_KEY = 'recipe_index_changes:{version}'
+CHANGES_TIMEOUT = 60 * 60
+MAX_CHANGES = 1000
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс продукт -> рецепты в памяти процесса для подбора
+    рецептов по имеющимся продуктам. Рецепты пронумерованы, у каждого
+    продукта массив номеров рецептов, у каждого рецепта - число его
+    продуктов. Изменённые рецепты записываются в кеш под новой версией
+    индекса, и каждый процесс перечитывает только их; если изменений
+    слишком много или они пропали из кеша, индекс строится заново.
+    Полный сброс командами загрузки данных записывается в базу,
+    как у индекса продуктов.
+
+    Состояние индекса - один кортеж (id рецептов, номера рецептов,
+    продукты рецептов, число продуктов, массивы номеров по продуктам),
+    который заменяется целиком, поэтому поиск без блокировки всегда
+    видит согласованный снимок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._stored_version = None
+        self._index = ([], {}, [], array('I'), {})
+
+    def get_version(self):
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        return cache.get(VERSION_KEY)
+
+    def invalidate(self):
+        store_version(VERSION_KEY)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+        self._version = None
+
+    def changed(self, recipe_ids):
+        """
+        Отмечает рецепты с изменёнными продуктами
+        после фиксации транзакции.
+        """
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self.publish(recipe_ids))
+
+    def publish(self, recipe_ids):
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            return
+        cache.set(CHANGES_KEY.format(version=version), recipe_ids,
+                  CHANGES_TIMEOUT)
+
+    def build(self):
+        recipe_ids = []
+        positions = {}
+        ingredients = []
+        postings = defaultdict(lambda: array('I'))
+        rows = IngredientInRecipe.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            if recipe_id not in positions:
+                positions[recipe_id] = len(recipe_ids)
+                recipe_ids.append(recipe_id)
+                ingredients.append(array('I'))
+            position = positions[recipe_id]
+            ingredients[position].append(ingredient_id)
+            postings[ingredient_id].append(position)
+        totals = array('I', (len(items) for items in ingredients))
+        self._index = (recipe_ids, positions, ingredients, totals,
+                       dict(postings))
+
+    def apply(self, changed_ids):
+        """
+        Перечитывает продукты изменённых рецептов в копию индекса.
+        Прежний номер рецепта остаётся пустым, рецепт с продуктами
+        получает новый номер. Массивы номеров по продуктам не меняются
+        на месте, изменённые заменяются новыми.
+        """
+        rows = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+                recipe_id__in=changed_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            rows[recipe_id].append(ingredient_id)
+        recipe_ids, positions, ingredients, totals, postings = self._index
+        recipe_ids = list(recipe_ids)
+        positions = dict(positions)
+        ingredients = list(ingredients)
+        totals = array('I', totals)
+        postings = dict(postings)
+        for recipe_id in changed_ids:
+            position = positions.pop(recipe_id, None)
+            if position is not None:
+                totals[position] = 0
+                for ingredient_id in ingredients[position]:
+                    postings[ingredient_id] = array('I', (
+                        item for item in postings[ingredient_id]
+                        if item != position
+                    ))
+                ingredients[position] = array('I')
+            if not rows[recipe_id]:
+                continue
+            position = len(recipe_ids)
+            recipe_ids.append(recipe_id)
+            positions[recipe_id] = position
+            ingredients.append(array('I', rows[recipe_id]))
+            totals.append(len(rows[recipe_id]))
+            for ingredient_id in rows[recipe_id]:
+                posting = array('I', postings.get(ingredient_id, ()))
+                posting.append(position)
+                postings[ingredient_id] = posting
+        self._index = (recipe_ids, positions, ingredients, totals,
+                       postings)
+
+    def get_changes(self, version):
+        if self._version is None or not (
+                0 < version - self._version <= MAX_CHANGES):
+            return None
+        keys = [
+            CHANGES_KEY.format(version=number)
+            for number in range(self._version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(chain.from_iterable(changes.values()))
+
+    def refresh(self):
+        """
+        Приводит индекс к текущей версии. Когда пустых номеров
+        становится больше, чем занятых, индекс строится заново.
+        """
+        version = self.get_version()
+        stored_version = get_stored_version(VERSION_KEY)
+        if (self._version == version
+                and self._stored_version == stored_version):
+            return
+        with self._lock:
+            if (self._version == version
+                    and self._stored_version == stored_version):
+                return
+            changes = None
+            if self._stored_version == stored_version:
+                changes = self.get_changes(version)
+            if changes is None:
+                self.build()
+            else:
+                self.apply(changes)
+                recipe_ids, positions, _, _, _ = self._index
+                if len(recipe_ids) > 2 * len(positions) + 1000:
+                    self.build()
+            self._version = version
+            self._stored_version = stored_version
+
+    def match(self, ingredient_ids, excluded_ids=()):
+        """
+        Рецепты, в которых есть хотя бы один из продуктов ingredient_ids
+        и нет ни одного из excluded_ids, по убыванию доли имеющихся
+        продуктов, затем по возрастанию числа недостающих.
+        Возвращает кортежи (id рецепта, есть продуктов, всего продуктов).
+        """
+        self.refresh()
+        recipe_ids, _, _, totals, postings = self._index
+        counts = Counter()
+        for ingredient_id in set(ingredient_ids):
+            counts.update(postings.get(ingredient_id, ()))
+        excluded = set()
+        for ingredient_id in set(excluded_ids):
+            excluded.update(postings.get(ingredient_id, ()))
+        matches = [
+            (recipe_ids[position], count, totals[position])
+            for position, count in counts.items()
+            if totals[position] and position not in excluded
+        ]
+        matches.sort(key=lambda match: (
+            -match[1] / match[2], match[2] - match[1], -match[0]
+        ))
+        return matches
+
+
+recipe_index = RecipeIngredientIndex()
@@ -0,0 +1,115 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+CONFIG = 'russian'
+
+POSTGRESQL_MATCH = (
+    f"recipes_recipe.search_vector @@ to_tsquery('{CONFIG}', %s)"
+)
+POSTGRESQL_RANK = (
+    "ts_rank(recipes_recipe.search_vector, "
+    f"to_tsquery('{CONFIG}', %s))"
+)
+SQLITE_MATCH = (
+    'recipes_recipe.id IN (SELECT rowid FROM recipes_recipe_fts '
+    'WHERE recipes_recipe_fts MATCH %s)'
+)
+SQLITE_RANK = (
+    '(SELECT -bm25(recipes_recipe_fts, 2.0, 1.0) FROM recipes_recipe_fts '
+    'WHERE recipes_recipe_fts MATCH %s '
+    'AND recipes_recipe_fts.rowid = recipes_recipe.id)'
+)
+SQLITE_TRIGGERS = (
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_TRIGGER_NAMES = (
+    'recipes_recipe_fts_insert',
+    'recipes_recipe_fts_delete',
+    'recipes_recipe_fts_update',
+)
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    SQLite пересоздаёт таблицу рецептов при изменении её полей
+    (AddField, AlterField, RemoveField модели Recipe), и триггеры FTS5
+    удаляются вместе со старой таблицей. Такие миграции должны
+    заканчиваться вызовом этой функции:
+    migrations.RunPython(restore_search_triggers, migrations.RunPython.noop).
+    Триггеры создаются заново, индекс перестраивается по таблице.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in SQLITE_TRIGGER_NAMES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for statement in SQLITE_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(
+        "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')"
+    )
+
+
+def query_words(text):
+    """
+    Слова запроса: буквы и цифры, остальные символы - разделители,
+    поэтому синтаксис поисковых запросов в тексте не работает.
+    """
+    return re.findall(r'[^\W_]+', text)
+
+
+def postgresql_query(words):
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+def sqlite_query(words):
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, text):
+    """
+    Рецепты, в названии или описании которых каждое слово запроса
+    совпадает с началом какого-нибудь слова, с релевантностью
+    в search_rank: совпадение в названии весит больше. Правило одно
+    для PostgreSQL и SQLite, но PostgreSQL ещё и приводит слова
+    к основе и пропускает стоп-слова.
+    Поиск идёт по индексу, текст рецептов не просматривается.
+    """
+    words = query_words(text)
+    if not words:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        ).none()
+    if connection.vendor == 'postgresql':
+        match, rank = POSTGRESQL_MATCH, POSTGRESQL_RANK
+        query = postgresql_query(words)
+    else:
+        match, rank, query = SQLITE_MATCH, SQLITE_RANK, sqlite_query(words)
+    return queryset.extra(where=[match], params=[query]).annotate(
+        search_rank=RawSQL(rank, [query], output_field=FloatField())
+    )
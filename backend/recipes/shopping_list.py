@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import IngredientInRecipe, ShoppingCart
+
+VERSION_KEY = 'shopping_list_version:{user_id}'
+LIST_KEY = 'shopping_list:{user_id}:{version}'
+
+
+def get_version(user_id):
+    """
+    Версия списка покупок пользователя.
+    Если ключ версии вытеснен из кеша, создаётся новая версия,
+    которая не совпадает ни с одной из прежних.
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def build_shopping_list(user):
+    """
+    Суммирует продукты всех рецептов из корзины пользователя.
+    Список читается целиком, чтобы его можно было положить в кеш:
+    в нём по строке на продукт, а не на рецепт.
+    """
+    return list(IngredientInRecipe.objects.filter(
+        recipe__carts__user=user
+    ).values(
+        'ingredient',
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(
+        ingredients_number=Sum('amount')
+    ).order_by(
+        'ingredient__name'
+    ))
+
+
+def get_shopping_list(user):
+    """
+    Список покупок пользователя из кеша.
+    Пересчитывается только после изменения корзины
+    или продуктов рецептов в ней.
+    """
+    key = LIST_KEY.format(user_id=user.id, version=get_version(user.id))
+    shopping_list = cache.get(key)
+    if shopping_list is None:
+        shopping_list = build_shopping_list(user)
+        cache.set(key, shopping_list, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return shopping_list
+
+
+def invalidate_shopping_lists(user_ids):
+    """
+    Сбрасывает кешированные списки покупок пользователей
+    после фиксации транзакции, чтобы список, собранный до неё,
+    не попал в кеш под новой версией.
+    """
+    user_ids = set(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            try:
+                cache.incr(VERSION_KEY.format(user_id=user_id))
+            except ValueError:
+                pass
+
+    transaction.on_commit(bump)
+
+
+def invalidate_recipes_shopping_lists(recipe_ids):
+    """
+    Сбрасывает списки покупок всех, у кого рецепты лежат в корзине.
+    """
+    invalidate_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('user_id', flat=True)
+    )
@@ -0,0 +1,115 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .counters import decrement, increment
+from .images import schedule_variants
+from .ingredient_index import ingredient_index
+from .media import acquire, release
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, Tag)
+from .recipe_index import recipe_index
+from .shopping_list import (invalidate_recipes_shopping_lists,
+                            invalidate_shopping_lists)
+from .tag_registry import tag_registry
+from .versions import touch_content, touch_viewer
+from users.models import Subscribe, User
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    invalidate_shopping_lists([instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate_recipes_shopping_lists([instance.recipe_id])
+    recipe_index.changed([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate_recipes_shopping_lists(
+        instance.recipe_ingredient.values('recipe')
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_index_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_registry_changed(sender, **kwargs):
+    tag_registry.invalidate()
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def recipes_content_changed(sender, **kwargs):
+    touch_content()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        touch_content()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscribe)
+def viewer_state_changed(sender, instance, **kwargs):
+    touch_viewer(instance.user_id)
+
+
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscribe: (User, 'author_id', 'followers_count'),
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscribe)
+def counted_object_created(sender, instance, created, **kwargs):
+    if created:
+        model, key, field = COUNTERS[sender]
+        increment(model, getattr(instance, key), field)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscribe)
+def counted_object_deleted(sender, instance, **kwargs):
+    model, key, field = COUNTERS[sender]
+    decrement(model, getattr(instance, key), field)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(sender, instance, **kwargs):
+    instance._saved_image = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_saved_image', None)
+    if previous != instance.image.name:
+        acquire(instance.image.name)
+        release(previous)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    release(instance.image.name)
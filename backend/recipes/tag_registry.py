@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Tag
+from .versions import get_stored_version, store_version
+
+VERSION_KEY = 'tag_registry_version'
+
+
+class TagRegistry:
+    """
+    Теги в памяти процесса: их немного и меняются они редко.
+    Загружаются при первом обращении и перечитываются после
+    изменения тегов, версия хранится в кеше, как у индекса продуктов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._tags = {}
+        self._ids = {}
+        self._etag = None
+
+    def get_version(self):
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        return cache.get(VERSION_KEY), get_stored_version(VERSION_KEY)
+
+    def invalidate(self):
+        store_version(VERSION_KEY)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+        self._version = None
+
+    def build(self, version):
+        tags = list(Tag.objects.order_by('id').values(
+            'id', 'name', 'color', 'slug'
+        ))
+        self._tags = {tag['id']: tag for tag in tags}
+        self._ids = {tag['slug']: tag['id'] for tag in tags}
+        self._etag = hashlib.md5(
+            json.dumps(tags, ensure_ascii=False).encode()
+        ).hexdigest()
+        self._version = version
+
+    def refresh(self):
+        version = self.get_version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self.build(version)
+
+    def all(self):
+        self.refresh()
+        return list(self._tags.values())
+
+    def get_tags(self):
+        """
+        Словарь тегов по id.
+        """
+        self.refresh()
+        return self._tags
+
+    def resolve(self, slugs):
+        """
+        id тегов по slug, неизвестные slug пропускаются.
+        """
+        self.refresh()
+        return {self._ids[slug] for slug in slugs if slug in self._ids}
+
+    @property
+    def etag(self):
+        """
+        Хеш содержимого реестра для заголовка ETag.
+        """
+        self.refresh()
+        return self._etag
+
+
+tag_registry = TagRegistry()
@@ -0,0 +1,37 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from .models import Ingredient, Recipe
+from users.models import User
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Индексы есть в PostgreSQL')
+class IndexPlanTest(TestCase):
+    """
+    Планы запросов фильтров используют индексы. На маленьких таблицах
+    последовательное чтение дешевле, поэтому оно отключается.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            'author@foodgram.ru', 'author', 'password',
+            first_name='Имя', last_name='Фамилия'
+        )
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_author_recipes(self):
+        plan = Recipe.objects.filter(
+            author=self.author
+        ).order_by('-pub_date').explain()
+        self.assertIn('recipe_author_pub_date_idx', plan)
+
+    def test_ingredient_name_search(self):
+        plan = Ingredient.objects.filter(name__icontains='сол').explain()
+        self.assertIn('ingredient_name_trgm_idx', plan)
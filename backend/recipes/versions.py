@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DataVersion
+
+CONTENT_KEY = 'recipes_content_version'
+VIEWER_KEY = 'recipes_viewer_version:{user_id}'
+
+_stored_versions = {}
+
+
+def get_version(key):
+    """
+    Время последнего изменения данных под ключом, в секундах.
+    Если ключа нет в кеше, изменением считается текущий момент.
+    """
+    cache.add(key, time.time(), None)
+    return cache.get(key)
+
+
+def touch(key):
+    """
+    Отмечает изменение после фиксации транзакции,
+    чтобы новая версия не опережала данные в базе.
+    """
+    transaction.on_commit(lambda: cache.set(key, time.time(), None))
+
+
+def touch_content():
+    """
+    Изменились данные, общие для всех рецептов:
+    авторы, продукты или удалён рецепт.
+    """
+    touch(CONTENT_KEY)
+
+
+def touch_viewer(user_id):
+    """
+    Изменились избранное, список покупок или подписки пользователя.
+    """
+    touch(VIEWER_KEY.format(user_id=user_id))
+
+
+def get_versions(user):
+    versions = [get_version(CONTENT_KEY)]
+    if user.is_authenticated:
+        versions.append(get_version(VIEWER_KEY.format(user_id=user.id)))
+    return versions
+
+
+def get_stored_version(name):
+    """
+    Время последнего полного сброса индекса name из базы.
+    В каждом процессе читается не чаще раза
+    в DATA_VERSION_CHECK_INTERVAL секунд.
+    """
+    now = time.monotonic()
+    checked = _stored_versions.get(name)
+    if checked is None or (
+            now - checked[0] >= settings.DATA_VERSION_CHECK_INTERVAL):
+        checked = _stored_versions[name] = (
+            now,
+            DataVersion.objects.filter(name=name).values_list(
+                'updated_at', flat=True
+            ).first()
+        )
+    return checked[1]
+
+
+def store_version(name):
+    """
+    Отмечает полный сброс индекса name в базе: его увидят
+    и процессы, которые не разделяют кеш с текущим.
+    """
+    DataVersion.objects.update_or_create(name=name)
+    _stored_versions.pop(name, None)
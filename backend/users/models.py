@@ -26,7 +26,30 @@ class UserManager(BaseUserManager):
         return self.create_user(email, username, password, **extra_fields)
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class CounterFieldsMixin:
+    """
+    Счётчики из counter_fields меняются только атомарными
+    UPDATE с F(), поэтому при сохранении существующей записи
+    они не перезаписываются значениями, загруженными ранее.
+    """
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if not self._state.adding and not force_insert:
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                ]
+            update_fields = [
+                field for field in update_fields
+                if field not in self.counter_fields
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class User(CounterFieldsMixin, AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(
         verbose_name='Электронная почта',
         max_length=254,
@@ -51,6 +74,17 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name='Права доступа',
         default=False
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False,
+    )
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password',)
 